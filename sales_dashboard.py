@@ -1,4 +1,8 @@
+import os
+import threading
+
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 
@@ -8,10 +12,62 @@ st.set_page_config(layout="wide", page_title="Sales Dashboard")
 # =========================
 # LOAD DATA
 # =========================
-@st.cache_data
-def load_data():
+def read_raw_csv(path):
+    # The pyarrow engine parses columns on all cores; fall back to the C engine if it's missing
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return pd.read_csv(path, engine="c", low_memory=False)
+    return pd.read_csv(path, engine="pyarrow")
+
+def read_raw_data(csv_path, parquet_path):
+    # Keep a typed Parquet copy of the CSV so cold loads skip CSV parsing. The copy
+    # records the CSV's mtime and size it was built from and is rebuilt whenever either
+    # differs (an older, backdated CSV counts too) or the file can't be read. Without
+    # pyarrow, or if the copy can't be written, read the CSV directly.
+    csv_stat = os.stat(csv_path)
+    source = f"{csv_stat.st_mtime_ns}:{csv_stat.st_size}".encode()
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return read_raw_csv(csv_path)
+    try:
+        metadata = pq.read_schema(parquet_path).metadata or {}
+        if metadata.get(b"source_csv") == source:
+            return pd.read_parquet(parquet_path)
+    except (OSError, ValueError, pa.ArrowException):
+        # Missing, truncated or otherwise unreadable: treat it as stale
+        pass
+
+    df = read_raw_csv(csv_path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata, b"source_csv": source})
+    # Write to a temp file and swap it in, so concurrent readers never see a partial file
+    tmp_path = f"{parquet_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, parquet_path)
+    except (OSError, pa.ArrowException):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return df
+
+def csv_mtime():
+    # Cache key for everything derived from the CSV, so editing the file reloads it
+    try:
+        return os.path.getmtime("RawData.csv")
+    except OSError:
+        return None
+
+# Keyed on the CSV's mtime so editing the file reloads it; only the current version
+# is worth keeping, so older cleaned frames are dropped
+@st.cache_data(max_entries=1)
+def load_data(mtime):
     try:
-        df = pd.read_csv("RawData.csv")
+        df = read_raw_data("RawData.csv", "RawData.parquet")
     except FileNotFoundError:
         st.error("RawData.csv not found.")
         return pd.DataFrame()
@@ -28,24 +84,43 @@ def load_data():
     df = df.rename(columns=rename_map)
 
     # --- Data Cleaning ---
-    df["Type"] = df["Type"].astype(str).str.upper().str.strip()
+    # Type has only a handful of distinct labels: normalize those once and map them back
+    type_raw = df["Type"].astype(str)
+    type_map = {t: str(t).upper().strip() for t in type_raw.unique()}
+    df["Type"] = type_raw.map(type_map).astype("category")
     df["Value"] = pd.to_numeric(df["Value"], errors="coerce").fillna(0)
     df["Qty"] = pd.to_numeric(df.get("Qty", 0), errors="coerce").fillna(0)
+    # Qty fits a narrower integer, which shrinks the filtered copies and the Qty column
+    # read by the KPI and fast-SKU sums in compute_aggregates (they still accumulate in
+    # int64). Value stays float64 since float32 loses cents on dashboard-sized totals.
+    df["Qty"] = pd.to_numeric(df["Qty"], downcast="integer")
 
     # 🔴 Force returns to be negative
-    df.loc[df["Type"] == "RETURN", "Value"] = -df.loc[df["Type"] == "RETURN", "Value"].abs()
+    is_return = (df["Type"] == "RETURN").to_numpy()
+    value = df["Value"].to_numpy()
+    df["Value"] = np.where(is_return, -np.abs(value), value)
 
     # --- Date Parsing (DD/MM/YYYY) ---
-    df["Date"] = pd.to_datetime(df["Date"], dayfirst=True, errors="coerce")
+    # An explicit format keeps pandas on its vectorized parser instead of per-row inference
+    df["Date"] = pd.to_datetime(df["Date"], format="%d/%m/%Y", errors="coerce")
     df = df.dropna(subset=["Date"])
 
     # --- Create Month-Year column for the trend graph ---
-    # We use periods or floor dates so the graph stays in chronological order
-    df["Month"] = df["Date"].dt.to_period("M").dt.to_timestamp()
+    # Truncating to datetime64[M] floors to the month in numpy, without Period objects,
+    # so the graph stays in chronological order
+    df["Month"] = df["Date"].to_numpy().astype("datetime64[M]").astype("datetime64[ns]")
+
+    # --- Index for fast filtering ---
+    # A sorted Date index turns the date range into a slice, and categorical
+    # dimensions make isin() an integer-code comparison
+    df = df.sort_values("Date").set_index("Date")
+    for col in ["Channel", "Category", "SubCategory", "Salesman", "PartNo"]:
+        df[col] = df[col].astype("category")
 
     return df
 
-df = load_data()
+data_mtime = csv_mtime()
+df = load_data(data_mtime)
 
 if df.empty:
     st.stop()
@@ -59,52 +134,157 @@ st.title("📊 Sales Dashboard")
 f_row1 = st.columns(4)
 f_row2 = st.columns(4)
 
+# Filter dimensions are categorical, so their (sorted) option lists come straight
+# from the categories instead of a unique() + sort over every row on each rerun
+
 # Row 1
-start_date = f_row1[0].date_input("Start Date", df["Date"].min())
-end_date = f_row1[1].date_input("End Date", df["Date"].max())
+start_date = f_row1[0].date_input("Start Date", df.index.min())
+end_date = f_row1[1].date_input("End Date", df.index.max())
 type_filter = f_row1[2].selectbox("Type", ["BOTH", "SALE", "RETURN"])
-channel_filter = f_row1[3].multiselect("Channel", sorted(df["Channel"].unique()))
+channel_filter = f_row1[3].multiselect("Channel", df["Channel"].cat.categories.tolist())
 
 # Row 2 (Added Category, SubCat, Salesman, and PartNo filters)
-cat_filter = f_row2[0].multiselect("Category", sorted(df["Category"].unique()))
-subcat_filter = f_row2[1].multiselect("Sub Category", sorted(df["SubCategory"].unique()))
-salesman_filter = f_row2[2].multiselect("Sales Executive", sorted(df["Salesman"].unique()))
-part_filter = f_row2[3].multiselect("Part Number", sorted(df["PartNo"].unique()))
-
-# --- Apply All Filters ---
-mask = (df["Date"] >= pd.to_datetime(start_date)) & (df["Date"] <= pd.to_datetime(end_date))
-
-if type_filter != "BOTH":
-    mask &= (df["Type"] == type_filter)
-if channel_filter:
-    mask &= (df["Channel"].isin(channel_filter))
-if cat_filter:
-    mask &= (df["Category"].isin(cat_filter))
-if subcat_filter:
-    mask &= (df["SubCategory"].isin(subcat_filter))
-if salesman_filter:
-    mask &= (df["Salesman"].isin(salesman_filter))
-if part_filter:
-    mask &= (df["PartNo"].isin(part_filter))
-
-filtered_df = df[mask]
+cat_filter = f_row2[0].multiselect("Category", df["Category"].cat.categories.tolist())
+subcat_filter = f_row2[1].multiselect("Sub Category", df["SubCategory"].cat.categories.tolist())
+salesman_filter = f_row2[2].multiselect("Sales Executive", df["Salesman"].cat.categories.tolist())
+part_filter = f_row2[3].multiselect("Part Number", df["PartNo"].cat.categories.tolist())
 
 # =========================
-# KPI CALCULATIONS
+# FILTERED AGGREGATES
 # =========================
-sales_df = filtered_df[filtered_df["Type"] == "SALE"]
-return_df = filtered_df[filtered_df["Type"] == "RETURN"]
+@st.cache_resource
+def numba_code_sum():
+    # Compile the grouped-sum kernel once per process. numba is optional (it isn't in
+    # requirements.txt); without it, group_sum() uses the pandas groupby.
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+
+    def code_sum(codes, values, n_groups):
+        totals = np.zeros(n_groups)
+        counts = np.zeros(n_groups, dtype=np.int64)
+        for i in range(codes.shape[0]):
+            code = codes[i]
+            if code >= 0:
+                totals[code] += values[i]
+                counts[code] += 1
+        return totals, counts
+
+    # cache=True reuses the compiled kernel across restarts instead of re-JITting it.
+    # numba raises RuntimeError when it has nowhere writable to keep that cache
+    # (read-only containers); fall back to pandas rather than failing the page.
+    try:
+        return njit(cache=True)(code_sum)
+    except RuntimeError:
+        return None
+
+def group_sum(values, keys):
+    # Sum values per category of a categorical key (observed groups only), walking the
+    # integer codes in one numba pass when available instead of pandas' Cython groupby
+    code_sum = numba_code_sum()
+    if code_sum is None:
+        return values.groupby(keys, observed=True).sum()
+    categories = keys.cat.categories
+    totals, counts = code_sum(
+        keys.cat.codes.to_numpy(), values.to_numpy(dtype="float64"), len(categories)
+    )
+    observed = counts > 0
+    return pd.Series(
+        totals[observed],
+        index=pd.CategoricalIndex(categories[observed], categories=categories, name=keys.name),
+        name=values.name,
+    )
+
+# Every widget interaction reruns the script, so everything derived from the filters
+# is computed in one cached function keyed on the (hashable) filter values. The number
+# of kept selections is bounded so results for old CSV versions age out.
+@st.cache_data(max_entries=128)
+def compute_aggregates(data_mtime, start_date, end_date, type_filter, channels, categories, subcats, salesmen, parts):
+    df = load_data(data_mtime)
+
+    # --- Apply All Filters ---
+    start_ts = pd.Timestamp(start_date)
+    end_ts = pd.Timestamp(end_date)
+    date_df = df.loc[start_ts:end_ts]
+    mask = np.ones(len(date_df), dtype=bool)
+
+    if type_filter != "BOTH":
+        mask &= (date_df["Type"] == type_filter).to_numpy()
+    if channels:
+        mask &= (date_df["Channel"].isin(channels)).to_numpy()
+    if categories:
+        mask &= (date_df["Category"].isin(categories)).to_numpy()
+    if subcats:
+        mask &= (date_df["SubCategory"].isin(subcats)).to_numpy()
+    if salesmen:
+        mask &= (date_df["Salesman"].isin(salesmen)).to_numpy()
+    if parts:
+        mask &= (date_df["PartNo"].isin(parts)).to_numpy()
+
+    # With no filters beyond the dates the slice is used as-is, skipping a full copy
+    filtered_df = date_df if mask.all() else date_df[mask]
+
+    # --- KPIs (a single grouped pass instead of one sub-frame per Type) ---
+    type_totals = filtered_df.groupby("Type", observed=True)[["Value", "Qty"]].sum()
+    net_revenue = type_totals["Value"].sum()
+    type_totals = type_totals.reindex(["SALE", "RETURN"], fill_value=0)
+
+    # --- Monthly trend (Sales vs Returns over time) ---
+    # observed=True keeps this at one row per month/type actually present, and the
+    # groupby already returns it in chronological order
+    monthly_trend = filtered_df.groupby(["Month", "Type"], observed=True)["Value"].sum().reset_index()
+
+    # --- Share charts ---
+    # Pre-aggregate so plotly receives one row per slice rather than every sale;
+    # only the absolute Value column is materialized, not a copy of the frame
+    abs_value = filtered_df["Value"].abs().rename("AbsValue")
+    cat_share = group_sum(abs_value, filtered_df["Category"]).reset_index()
+    ch_share = group_sum(abs_value, filtered_df["Channel"]).reset_index()
+
+    # --- Fast moving SKU (top-10 selection, no full sort of every group) ---
+    fast_sku = (
+        filtered_df.loc[
+            (filtered_df["Type"] == "SALE").to_numpy(),
+            ["PartNo", "Category", "SubCategory", "Qty"],
+        ]
+        .groupby(["PartNo", "Category", "SubCategory"], observed=True)["Qty"]
+        .sum()
+        .nlargest(10)
+        .reset_index()
+    )
 
-net_revenue = filtered_df["Value"].sum()
-sales_value = sales_df["Value"].sum()
-return_value = return_df["Value"].sum()
-sales_volume = sales_df["Qty"].sum()
+    return {
+        "net_revenue": net_revenue,
+        "sales_value": type_totals.loc["SALE", "Value"],
+        "return_value": type_totals.loc["RETURN", "Value"],
+        "sales_volume": type_totals.loc["SALE", "Qty"],
+        "monthly_trend": monthly_trend,
+        "cat_share": cat_share,
+        "ch_share": ch_share,
+        "fast_sku": fast_sku,
+    }
+
+agg = compute_aggregates(
+    data_mtime,
+    start_date,
+    end_date,
+    type_filter,
+    tuple(sorted(channel_filter)),
+    tuple(sorted(cat_filter)),
+    tuple(sorted(subcat_filter)),
+    tuple(sorted(salesman_filter)),
+    tuple(sorted(part_filter)),
+)
 
+# =========================
+# KPI CALCULATIONS
+# =========================
 k1, k2, k3, k4 = st.columns(4)
-k1.metric("Net Revenue", f"OMR {net_revenue:,.2f}")
-k2.metric("Sale Value", f"OMR {sales_value:,.2f}")
-k3.metric("Return Value", f"OMR {return_value:,.2f}")
-k4.metric("Sale Volume", f"{sales_volume:,.0f}")
+k1.metric("Net Revenue", f"OMR {agg['net_revenue']:,.2f}")
+k2.metric("Sale Value", f"OMR {agg['sales_value']:,.2f}")
+k3.metric("Return Value", f"OMR {agg['return_value']:,.2f}")
+k4.metric("Sale Volume", f"{agg['sales_volume']:,.0f}")
 
 # =========================
 # NEW: MONTHLY PERFORMANCE TREND
@@ -112,13 +292,8 @@ k4.metric("Sale Volume", f"{sales_volume:,.0f}")
 st.markdown("---")
 st.subheader("📈 Monthly Performance Trend")
 
-if not filtered_df.empty:
-    # Group by Month and Type to see Sales vs Returns over time
-    monthly_trend = filtered_df.groupby(["Month", "Type"])["Value"].sum().reset_index()
-    
-    # Sort by date so the graph flows correctly
-    monthly_trend = monthly_trend.sort_values("Month")
-    
+monthly_trend = agg["monthly_trend"]
+if not monthly_trend.empty:
     # Create the chart
     fig_trend = px.bar(
         monthly_trend, 
@@ -133,6 +308,9 @@ if not filtered_df.empty:
     
     # Formatting X-Axis to show Month names
     fig_trend.update_xaxes(dtick="M1", tickformat="%b %Y")
+
+    # Keep zoom/legend state across reruns instead of re-initializing the chart
+    fig_trend.update_layout(uirevision="trend")
     
     st.plotly_chart(fig_trend, use_container_width=True)
 else:
@@ -143,14 +321,14 @@ else:
 # =========================
 st.markdown("---")
 c1, c2 = st.columns(2)
-chart_data = filtered_df.copy()
-chart_data["AbsValue"] = chart_data["Value"].abs()
+cat_share = agg["cat_share"]
+ch_share = agg["ch_share"]
 
-if not chart_data.empty:
-    fig_cat = px.pie(chart_data, values="AbsValue", names="Category", hole=0.5, title="Category Share")
+if not cat_share.empty:
+    fig_cat = px.pie(cat_share, values="AbsValue", names="Category", hole=0.5, title="Category Share")
     c1.plotly_chart(fig_cat, use_container_width=True)
 
-    fig_ch = px.pie(chart_data, values="AbsValue", names="Channel", hole=0.5, title="Channel Share")
+    fig_ch = px.pie(ch_share, values="AbsValue", names="Channel", hole=0.5, title="Channel Share")
     c2.plotly_chart(fig_ch, use_container_width=True)
 
 # =========================
@@ -158,12 +336,4 @@ if not chart_data.empty:
 # =========================
 st.markdown("---")
 st.subheader("🔥 Top 10 Fast Moving SKU (Based on Selected Filters)")
-fast_sku = (
-    filtered_df[filtered_df["Type"] == "SALE"]
-    .groupby(["PartNo", "Category", "SubCategory"])["Qty"]
-    .sum()
-    .reset_index()
-    .sort_values("Qty", ascending=False)
-    .head(10)
-)
-st.dataframe(fast_sku, use_container_width=True)
+st.dataframe(agg["fast_sku"], use_container_width=True)